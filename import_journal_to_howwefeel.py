@@ -2,14 +2,23 @@
 import argparse
 import csv
 import datetime as dt
+import gzip
 import html
+import http.client
+import io
 import json
 import os
 import re
 import unicodedata
-import urllib.error
-import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from html.parser import HTMLParser
+from itertools import repeat
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
 
 
 MONTHS_MAP = {
@@ -116,6 +125,40 @@ MONTHS_MAP = {
 
 WEEKDAYS_EN = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
+HTML_CHUNK_SIZE = 32768
+GZIP_MIN_BYTES = 1024
+
+_MONTH_WORD = r"[a-záéíóúàèìòùâêîôûãõç]+"
+_RE_DATE_MDY = re.compile(rf"({_MONTH_WORD})\s+(\d{{1,2}})\s+(\d{{4}})")
+_RE_DATE_DMY = re.compile(rf"(\d{{1,2}})\s+({_MONTH_WORD})\s+(\d{{4}})")
+_RE_NON_WORD = re.compile(r"[^\w]")
+_RE_SENT = re.compile(r"(?<=[.!?])\s+")
+_RE_TAKE = re.compile(r"\b(quero|pretendo|vou|preciso|devo|decidi|planejo)\b", re.IGNORECASE)
+_RE_PAGE_HEADER = re.compile(r"""class=["']pageHeader["'][^>]*>([^<]*)<""")
+_RE_LLM_LINE = re.compile(r"^[ \t]*(\d+)[ \t]*:[ \t]*(.*)$", re.MULTILINE)
+
+MOOD_PATTERNS = [
+    ("anxious", r"ansios|ansiedade|preocupad|nervos"),
+    ("depressed", r"depress|morrer|suicid|hopeless|sem raz[aã]o"),
+    ("tired", r"cansad|exaust|fatig"),
+    ("trapped", r"preso|pris[aã]o|trancad"),
+    ("frustrated", r"frustr|raiva|irrit|culpa|vergonh"),
+    ("inspired", r"inspir|motivad|orgulh|confian"),
+    ("grateful", r"grat|feliz|bem|esperan|otimi"),
+]
+
+MOOD_PREFS = {
+    "anxious": ["Anxious", "Concerned", "Uneasy"],
+    "depressed": ["Depressed", "Hopeless", "Miserable", "Down"],
+    "tired": ["Exhausted", "Tired", "Fatigued"],
+    "trapped": ["Trapped"],
+    "frustrated": ["Frustrated", "Peeved", "Guilty", "Ashamed"],
+    "inspired": ["Inspired", "Motivated", "Proud"],
+    "grateful": ["Grateful", "Hopeful", "Optimistic", "Good", "Content"],
+}
+
+_MOOD_RE = re.compile("|".join(rf"\b(?P<{name}>{pat})\b" for name, pat in MOOD_PATTERNS))
+
 
 def load_moods_file(path):
     moods = []
@@ -133,35 +176,38 @@ def load_moods_file(path):
     return moods
 
 
-class JournalHTMLParser(HTMLParser):
+class JournalTarget:
+    """Collects header, title and body text from parser events (lxml target interface)."""
+
     def __init__(self):
-        super().__init__()
         self.in_body = False
         self.in_page_header = False
         self.in_title = False
-        self.text_parts = []
+        self.body_buffer = io.StringIO()
+        self._in_text = False
         self.page_header = ""
         self.title = ""
-        self._stack = []
 
-    def handle_starttag(self, tag, attrs):
+    def start(self, tag, attrib):
+        self.start_tag(tag, attrib.get("class") if tag == "div" else None)
+
+    def start_tag(self, tag, div_class):
+        self._in_text = False
         if tag == "body":
             self.in_body = True
         if not self.in_body:
             return
 
-        attr_map = {k: v for k, v in attrs}
-        if tag == "div" and attr_map.get("class") == "pageHeader":
+        if div_class == "pageHeader":
             self.in_page_header = True
-        if tag == "div" and attr_map.get("class") == "title":
+        if div_class == "title":
             self.in_title = True
 
         if tag in ("p", "li", "br"):
-            self.text_parts.append("\n")
-
-        self._stack.append(tag)
+            self.body_buffer.write("\n")
 
-    def handle_endtag(self, tag):
+    def end(self, tag):
+        self._in_text = False
         if tag == "body":
             self.in_body = False
         if tag == "div":
@@ -169,10 +215,8 @@ class JournalHTMLParser(HTMLParser):
                 self.in_page_header = False
             if self.in_title:
                 self.in_title = False
-        if self._stack:
-            self._stack.pop()
 
-    def handle_data(self, data):
+    def data(self, data):
         if not self.in_body:
             return
         text = html.unescape(data)
@@ -181,31 +225,75 @@ class JournalHTMLParser(HTMLParser):
         elif self.in_title:
             self.title += text
         else:
-            self.text_parts.append(text)
+            # Separate text nodes with a space; text split across feed() chunks stays joined.
+            if not self._in_text:
+                self.body_buffer.write(" ")
+                self._in_text = True
+            self.body_buffer.write(text)
+
+    def close(self):
+        return self
+
+
+class JournalHTMLParser(HTMLParser):
+    """Stdlib fallback that forwards events to a JournalTarget when lxml is unavailable."""
+
+    def __init__(self):
+        super().__init__()
+        self.target = JournalTarget()
+
+    def handle_starttag(self, tag, attrs):
+        div_class = None
+        if tag == "div":
+            for key, value in attrs:
+                if key == "class":
+                    div_class = value
+                    break
+        self.target.start_tag(tag, div_class)
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
 
 
 def normalize_token(text):
     text = text.strip().lower()
     text = unicodedata.normalize("NFD", text)
     text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
-    text = re.sub(r"[^\w]", "", text)
+    text = _RE_NON_WORD.sub("", text)
     return text
 
 
+def _scan_date_de(text):
+    # Token scan for "<d> de <month> de <yyyy>"; cheaper than a regex for this fixed shape.
+    tokens = text.split()
+    for i in range(len(tokens) - 4):
+        day, de1, month_word, de2, year = tokens[i : i + 5]
+        if de1 != "de" or de2 != "de":
+            continue
+        if len(day) > 2 or not day.isdecimal() or not month_word.isalpha():
+            continue
+        if len(year) < 4 or not year[:4].isdecimal():
+            continue
+        return int(day), month_word, int(year[:4])
+    return None
+
+
 def parse_date_from_header(header_text):
     text = header_text.strip().lower().replace(",", " ")
 
     # Pattern: 29 de outubro de 2025 (PT/ES/FR)
-    match = re.search(r"(\d{1,2})\s+de\s+([a-záéíóúàèìòùâêîôûãõç]+)\s+de\s+(\d{4})", text)
-    if match:
-        day = int(match.group(1))
-        month_name = normalize_token(match.group(2))
-        month = MONTHS_MAP.get(month_name)
+    parts = _scan_date_de(text)
+    if parts:
+        day, month_word, year = parts
+        month = MONTHS_MAP.get(normalize_token(month_word))
         if month:
-            return dt.date(int(match.group(3)), month, day)
+            return dt.date(year, month, day)
 
     # Pattern: November 29 2025
-    match = re.search(r"([a-záéíóúàèìòùâêîôûãõç]+)\s+(\d{1,2})\s+(\d{4})", text)
+    match = _RE_DATE_MDY.search(text)
     if match:
         month_name = normalize_token(match.group(1))
         month = MONTHS_MAP.get(month_name)
@@ -213,7 +301,7 @@ def parse_date_from_header(header_text):
             return dt.date(int(match.group(3)), month, int(match.group(2)))
 
     # Pattern: 29 November 2025
-    match = re.search(r"(\d{1,2})\s+([a-záéíóúàèìòùâêîôûãõç]+)\s+(\d{4})", text)
+    match = _RE_DATE_DMY.search(text)
     if match:
         day = int(match.group(1))
         month_name = normalize_token(match.group(2))
@@ -233,19 +321,17 @@ def format_date_for_csv(date_obj, time_str):
 
 
 def normalize_text(text):
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+    return " ".join(text.split())
 
 
 def split_sentences(text):
-    parts = re.split(r"(?<=[.!?])\s+", text)
+    parts = _RE_SENT.split(text)
     return [p.strip() for p in parts if p.strip()]
 
 
-def extract_takeaway(text):
-    sentences = split_sentences(text)
+def extract_takeaway_from_sentences(sentences):
     for s in sentences:
-        if re.search(r"\b(quero|pretendo|vou|preciso|devo|decidi|planejo)\b", s, re.IGNORECASE):
+        if _RE_TAKE.search(s):
             return s
     return ""
 
@@ -275,17 +361,38 @@ def load_env(paths):
             continue
 
 
-def load_existing_moods(csv_path):
+def parse_csv_date(date_str):
+    try:
+        return dt.datetime.strptime(date_str, "%Y %a %b %d %I:%M %p").date()
+    except ValueError:
+        return None
+
+
+def load_csv_state(csv_path):
     moods = set()
+    keys_by_prefix = {}
+    days = set()
     if not os.path.exists(csv_path):
-        return moods
+        return moods, keys_by_prefix, days
     with open(csv_path, newline="", encoding="utf-8") as f:
         reader = csv.reader(f)
         headers = next(reader, None)
         if not headers:
-            return moods
+            return moods, keys_by_prefix, days
         for row in reader:
-            if len(row) < 2:
+            row_len = len(row)
+            if not row:
+                continue
+            date_str = row[0].strip()
+            notes = (row[15].strip() if row_len > 15 else "")
+            reflections = (row[16].strip() if row_len > 16 else "")
+            # Dedup keys grouped by the Date prefix (year, weekday, month initial), not by day.
+            keys_by_prefix.setdefault(date_str[:10], set()).add((notes[:40], reflections[:40]))
+            day = parse_csv_date(date_str)
+            if day:
+                days.add(day)
+
+            if row_len < 2:
                 continue
             mood_field = row[1].strip()
             if not mood_field:
@@ -294,7 +401,7 @@ def load_existing_moods(csv_path):
                 mood = mood.strip()
                 if mood:
                     moods.add(mood)
-    return moods
+    return moods, keys_by_prefix, days
 
 
 def build_mood_pool(existing_moods, extra_moods=None):
@@ -305,24 +412,77 @@ def build_mood_pool(existing_moods, extra_moods=None):
     return pool
 
 
+class LLMSession:
+    """Keep-alive HTTPS connection reused across LLM calls."""
+
+    def __init__(self, host="api.openai.com", timeout=30):
+        self.host = host
+        self.timeout = timeout
+        self.compress_requests = True
+        self._conn = None
+
+    def _send(self, path, body, headers):
+        if self._conn is None:
+            self._conn = http.client.HTTPSConnection(self.host, timeout=self.timeout)
+        self._conn.request("POST", path, body=body, headers=headers)
+        resp = self._conn.getresponse()
+        data = resp.read()
+        if (resp.getheader("Content-Encoding") or "").lower() == "gzip":
+            data = gzip.decompress(data)
+        return resp.status, data
+
+    def _post(self, path, body, headers):
+        reused = self._conn is not None
+        try:
+            return self._send(path, body, headers)
+        except (http.client.HTTPException, OSError):
+            self.close()
+            if not reused:
+                raise
+            # The server may have dropped the idle connection; retry once on a fresh one.
+            return self._send(path, body, headers)
+
+    def post_json(self, path, payload, headers):
+        body = json.dumps(payload).encode("utf-8")
+        headers = {**headers, "Accept-Encoding": "gzip"}
+        if self.compress_requests and len(body) >= GZIP_MIN_BYTES:
+            gzip_headers = {**headers, "Content-Encoding": "gzip"}
+            status, data = self._post(path, gzip.compress(body), gzip_headers)
+            if status not in (400, 415):
+                return self._decode(status, data)
+            # The endpoint rejected the compressed body; send plain JSON from now on.
+            self.compress_requests = False
+        status, data = self._post(path, body, headers)
+        return self._decode(status, data)
+
+    def _decode(self, status, data):
+        if status >= 400:
+            raise http.client.HTTPException(f"HTTP {status}")
+        return json.loads(data.decode("utf-8"))
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+@lru_cache(maxsize=16)
+def _decisive_categories(mood_pool):
+    # The first two categories (by priority) that can yield a mood decide choose_mood's result.
+    ranked = [name for name, _ in MOOD_PATTERNS if any(mood in mood_pool for mood in MOOD_PREFS[name])]
+    return frozenset(ranked[:2])
+
+
 def choose_mood(text, mood_pool, allow_fallback=True):
     text_l = text.lower()
-    mood_preferences = []
-
-    if re.search(r"\b(ansios|ansiedade|preocupad|nervos)\b", text_l):
-        mood_preferences.append(["Anxious", "Concerned", "Uneasy"])
-    if re.search(r"\b(depress|morrer|suicid|hopeless|sem raz[aã]o)\b", text_l):
-        mood_preferences.append(["Depressed", "Hopeless", "Miserable", "Down"])
-    if re.search(r"\b(cansad|exaust|fatig)\b", text_l):
-        mood_preferences.append(["Exhausted", "Tired", "Fatigued"])
-    if re.search(r"\b(preso|pris[aã]o|trancad)\b", text_l):
-        mood_preferences.append(["Trapped"])
-    if re.search(r"\b(frustr|raiva|irrit|culpa|vergonh)\b", text_l):
-        mood_preferences.append(["Frustrated", "Peeved", "Guilty", "Ashamed"])
-    if re.search(r"\b(inspir|motivad|orgulh|confian)\b", text_l):
-        mood_preferences.append(["Inspired", "Motivated", "Proud"])
-    if re.search(r"\b(grat|feliz|bem|esperan|otimi)\b", text_l):
-        mood_preferences.append(["Grateful", "Hopeful", "Optimistic", "Good", "Content"])
+    decisive = _decisive_categories(frozenset(mood_pool))
+    seen = set()
+    if decisive:
+        for match in _MOOD_RE.finditer(text_l):
+            seen.add(match.lastgroup)
+            if decisive <= seen:
+                break
+    mood_preferences = [MOOD_PREFS[name] for name, _ in MOOD_PATTERNS if name in seen]
 
     chosen = []
     for prefs in mood_preferences:
@@ -342,119 +502,217 @@ def choose_mood(text, mood_pool, allow_fallback=True):
     return ";".join(chosen) if chosen else ""
 
 
-def llm_choose_mood(text, existing_moods, model, api_key, max_moods=2, debug_label=None, debug=False):
-    if not api_key:
-        return ""
-    if not existing_moods:
-        return ""
-
-    moods_sorted = sorted(existing_moods)
-    moods_lower_map = {m.lower(): m for m in moods_sorted}
-
-    snippet = text[:2000]
-    prompt = (
-        "Choose up to {max_moods} moods from the list and respond ONLY with the names "
-        "separated by ';'. If none fit, respond with an empty string.\n\n"
-        "Mood list:\n{moods}\n\n"
-        "Text:\n{snippet}\n"
-    ).format(max_moods=max_moods, moods=", ".join(moods_sorted), snippet=snippet)
-
-    payload = {
-        "model": model,
-        "input": [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "input_text", "text": prompt},
-                ],
-            }
-        ],
-        "temperature": 0.2,
-        "max_output_tokens": 50,
-    }
-
-    if debug:
-        label = f"[LLM] {debug_label}" if debug_label else "[LLM]"
-        print(f"{label} prompt:\\n{prompt}\\n")
-
-    req = urllib.request.Request(
-        "https://api.openai.com/v1/responses",
-        data=json.dumps(payload).encode("utf-8"),
-        headers={
+class LLMClient:
+    """Batched mood fallback through the OpenAI Responses API."""
+
+    def __init__(self, moods_sorted, model, api_key, max_moods=2, batch_size=10, debug=False):
+        self.moods_lower_map = {m.lower(): m for m in moods_sorted}
+        self.model = model
+        self.api_key = api_key
+        self.max_moods = max_moods
+        self.batch_size = batch_size
+        self.debug = debug
+        self.session = LLMSession()
+        # Everything but the entries is identical across calls; build it once.
+        self.prompt_prefix = (
+            "For each entry below, choose up to {max_moods} moods from the list. Respond ONLY with one "
+            "line per entry in the format '<entry number>: mood1;mood2'. If none fit, leave the moods "
+            "empty after the colon.\n\n"
+            "Mood list:\n{moods}\n\n"
+        ).format(max_moods=max_moods, moods=", ".join(moods_sorted))
+        self.headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {api_key}",
-        },
-        method="POST",
-    )
+        }
+
+    def choose_moods(self, entries):
+        results = {}
+        if not self.api_key:
+            return results
+        if not self.moods_lower_map:
+            return results
+
+        for start in range(0, len(entries), self.batch_size):
+            batch = entries[start : start + self.batch_size]
+            raw_text = self._request(
+                [text for _, text in batch],
+                debug_label=", ".join(filename for filename, _ in batch),
+            )
+            for index, moods_field in _RE_LLM_LINE.findall(raw_text):
+                index = int(index)
+                if not 1 <= index <= len(batch):
+                    continue
+                chosen = []
+                for part in moods_field.split(";"):
+                    mood = part.strip()
+                    if not mood:
+                        continue
+                    normalized = self.moods_lower_map.get(mood.lower())
+                    if normalized and normalized not in chosen:
+                        chosen.append(normalized)
+                    if len(chosen) >= self.max_moods:
+                        break
+                results[batch[index - 1][0]] = ";".join(chosen)
+
+        return results
+
+    def _request(self, texts, debug_label=None):
+        prompt = self.prompt_prefix + "".join(
+            f"--- ENTRY {i} ---\n{text[:2000]}\n\n" for i, text in enumerate(texts, start=1)
+        )
+
+        payload = {
+            "model": self.model,
+            "input": [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "input_text", "text": prompt},
+                    ],
+                }
+            ],
+            "temperature": 0.2,
+            "max_output_tokens": 50 * len(texts),
+        }
+
+        if self.debug:
+            label = f"[LLM] {debug_label}" if debug_label else "[LLM]"
+            print(f"{label} prompt:\\n{prompt}\\n")
 
-    try:
-        with urllib.request.urlopen(req, timeout=30) as resp:
-            data = json.loads(resp.read().decode("utf-8"))
-    except (urllib.error.URLError, urllib.error.HTTPError, json.JSONDecodeError):
-        return ""
-
-    raw_text = ""
-    for item in data.get("output", []):
-        if item.get("type") == "message":
-            for content in item.get("content", []):
-                if content.get("type") == "output_text":
-                    raw_text += content.get("text", "")
-
-    raw_text = raw_text.strip()
-    if debug:
-        label = f"[LLM] {debug_label}" if debug_label else "[LLM]"
-        print(f"{label} output: {raw_text}\\n")
-    if not raw_text:
-        return ""
+        try:
+            data = self.session.post_json("/v1/responses", payload, headers=self.headers)
+        except (http.client.HTTPException, OSError, json.JSONDecodeError):
+            return ""
 
-    chosen = []
-    for part in raw_text.split(";"):
-        mood = part.strip()
-        if not mood:
-            continue
-        normalized = moods_lower_map.get(mood.lower())
-        if normalized and normalized not in chosen:
-            chosen.append(normalized)
-        if len(chosen) >= max_moods:
-            break
+        raw_text = ""
+        for item in data.get("output", []):
+            if item.get("type") == "message":
+                for content in item.get("content", []):
+                    if content.get("type") == "output_text":
+                        raw_text += content.get("text", "")
 
-    return ";".join(chosen)
+        raw_text = raw_text.strip()
+        if self.debug:
+            label = f"[LLM] {debug_label}" if debug_label else "[LLM]"
+            print(f"{label} output: {raw_text}\\n")
+        return raw_text
 
+    def close(self):
+        self.session.close()
 
-def parse_existing_keys(csv_path):
-    keys = set()
-    if not os.path.exists(csv_path):
-        return keys
-    with open(csv_path, newline="", encoding="utf-8") as f:
-        reader = csv.reader(f)
-        headers = next(reader, None)
-        if not headers:
-            return keys
-        for row in reader:
-            if len(row) < 1:
-                continue
-            date_str = row[0].strip()
-            notes = (row[15].strip() if len(row) > 15 else "")
-            reflections = (row[16].strip() if len(row) > 16 else "")
-            key = (date_str[:10], notes[:40], reflections[:40])
-            keys.add(key)
-    return keys
+
+def open_entry(path, binary=False):
+    opener = gzip.open if path.endswith(".gz") else open
+    if binary:
+        return opener(path, "rb")
+    return opener(path, "rt", encoding="utf-8")
 
 
 def process_html_file(path):
-    with open(path, "r", encoding="utf-8") as f:
-        content = f.read()
-    parser = JournalHTMLParser()
-    parser.feed(content)
+    if etree is not None:
+        journal = JournalTarget()
+        parser = etree.HTMLParser(target=journal, encoding="utf-8")
+        with open_entry(path, binary=True) as f:
+            while chunk := f.read(HTML_CHUNK_SIZE):
+                parser.feed(chunk)
+        try:
+            parser.close()
+        except etree.XMLSyntaxError:
+            # Empty or element-less files; keep whatever was collected, like html.parser does.
+            pass
+    else:
+        parser = JournalHTMLParser()
+        with open_entry(path) as f:
+            while chunk := f.read(HTML_CHUNK_SIZE):
+                parser.feed(chunk)
+        parser.close()
+        journal = parser.target
+
+    body_text = normalize_text(journal.body_buffer.getvalue().replace("•", " - "))
+
+    title = normalize_text(journal.title)
+    date_obj = parse_date_from_header(journal.page_header)
 
-    body_text = " ".join(parser.text_parts)
-    body_text = re.sub(r"\s*•\s*", " - ", body_text)
-    body_text = normalize_text(body_text)
+    return date_obj, title, body_text
 
-    title = normalize_text(parser.title)
-    date_obj = parse_date_from_header(parser.page_header)
 
-    return date_obj, title, body_text
+def read_header_date(path):
+    # Cheap pre-scan: the header sits right after the inline CSS, well within the first chunk.
+    with open_entry(path) as f:
+        head = f.read(HTML_CHUNK_SIZE)
+    match = _RE_PAGE_HEADER.search(head)
+    if not match:
+        return None
+    return parse_date_from_header(html.unescape(match.group(1)))
+
+
+def process_entry(path, mood_pool, time_str, allow_fallback, skip_dates=frozenset()):
+    if skip_dates:
+        header_date = read_header_date(path)
+        if header_date and header_date in skip_dates:
+            return None
+
+    date_obj, title, body = process_html_file(path)
+    if not date_obj or not body:
+        return None
+
+    date_str = format_date_for_csv(date_obj, time_str)
+    sentences = split_sentences(body)
+    if title:
+        notes = title
+    else:
+        notes = sentences[0] if sentences else body
+    takeaways = extract_takeaway_from_sentences(sentences)
+    mood = choose_mood(f"{title} {body}", mood_pool, allow_fallback=allow_fallback)
+    return os.path.basename(path), date_str, title, body, notes, takeaways, mood
+
+
+def iter_entries(paths, mood_pool, time_str, allow_fallback, skip_dates=frozenset()):
+    entry_args = (paths, repeat(mood_pool), repeat(time_str), repeat(allow_fallback), repeat(skip_dates))
+    workers = min(os.cpu_count() or 1, len(paths))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            yield from ex.map(process_entry, *entry_args, chunksize=16)
+    else:
+        yield from map(process_entry, *entry_args)
+
+
+def iter_new_rows(entries, existing_keys_by_prefix, force, llm_moods_for=None, batch_size=10):
+    # Rows are yielded in entry order; rows waiting on the LLM hold back the ones after them.
+    buffered = []
+    pending = []
+    for entry in entries:
+        if entry is None:
+            continue
+        filename, date_str, title, body, notes, takeaways, mood = entry
+        reflections = body
+
+        if not force:
+            # Same 10-char prefix as the original dedup key; the snippets decide.
+            prefix_keys = existing_keys_by_prefix.get(date_str[:10])
+            if prefix_keys and (notes[:40], reflections[:40]) in prefix_keys:
+                continue
+
+        row = build_row(date_str, mood, notes, reflections, takeaways)
+        buffered.append(row)
+        if not mood and llm_moods_for:
+            pending.append((filename, f"{title} {body}", row))
+        if len(pending) >= batch_size:
+            _apply_llm_moods(pending, llm_moods_for)
+            pending = []
+        if not pending:
+            yield from buffered
+            buffered = []
+
+    if pending:
+        _apply_llm_moods(pending, llm_moods_for)
+    yield from buffered
+
+
+def _apply_llm_moods(pending, llm_moods_for):
+    llm_moods = llm_moods_for([(filename, text) for filename, text, _ in pending])
+    for filename, _, row in pending:
+        row[1] = llm_moods.get(filename, row[1])
 
 
 def build_row(date_str, mood, notes, reflections, takeaways):
@@ -487,8 +745,14 @@ def main():
     parser.add_argument("--time", default="12:00 PM", help="Horário padrão para o campo Date (ex.: 12:00 PM).")
     parser.add_argument("--dry-run", action="store_true", help="Não escreve no CSV, apenas mostra resumo.")
     parser.add_argument("--force", action="store_true", help="Não tenta deduplicar entradas.")
+    parser.add_argument(
+        "--skip-existing-dates",
+        action="store_true",
+        help="Ignora HTMLs cuja data já existe no CSV, sem processá-los.",
+    )
     parser.add_argument("--llm-model", default="gpt-4o-mini", help="Modelo OpenAI para fallback de Mood.")
     parser.add_argument("--llm-off", action="store_true", help="Desativa fallback com LLM.")
+    parser.add_argument("--llm-batch-size", type=int, default=10, help="Entradas por chamada da LLM.")
     parser.add_argument("--llm-debug", action="store_true", help="Mostra prompt e resposta da LLM.")
     parser.add_argument("--moods-file", default="moods.txt", help="Arquivo com moods (um por linha).")
     args = parser.parse_args()
@@ -498,63 +762,63 @@ def main():
     script_dir = os.path.dirname(os.path.abspath(__file__))
     load_env([os.path.join(script_dir, ".env"), ".env"])
 
-    existing_moods = load_existing_moods(csv_path)
+    existing_moods, existing_keys_by_prefix, existing_days = load_csv_state(csv_path)
     if not existing_moods:
         print("Não encontrei moods existentes no CSV. Verifique o arquivo.")
         return
     extra_moods = load_moods_file(os.path.join(script_dir, args.moods_file))
-    mood_pool = build_mood_pool(existing_moods, extra_moods=extra_moods)
+    mood_pool = frozenset(build_mood_pool(existing_moods, extra_moods=extra_moods))
+    moods_sorted = tuple(sorted(mood_pool))
 
-    existing_keys = parse_existing_keys(csv_path)
     api_key = os.environ.get("OPENAI_API_KEY", "").strip()
     if not args.llm_off and not api_key:
         print("OPENAI_API_KEY não encontrado; fallback com LLM será ignorado.")
 
-    new_rows = []
-    for filename in sorted(os.listdir(entries_dir)):
-        if not filename.endswith(".html"):
-            continue
-        path = os.path.join(entries_dir, filename)
-        date_obj, title, body = process_html_file(path)
-        if not date_obj or not body:
-            continue
-
-        date_str = format_date_for_csv(date_obj, args.time)
-        notes = title if title else (split_sentences(body)[0] if split_sentences(body) else body)
-        reflections = body
-        takeaways = extract_takeaway(body)
-
-        mood = choose_mood(f"{title} {body}", mood_pool, allow_fallback=args.llm_off)
-        if not mood and not args.llm_off:
-            mood = llm_choose_mood(
-                f"{title} {body}",
-                mood_pool,
-                args.llm_model,
-                api_key,
-                debug_label=filename,
-                debug=args.llm_debug,
-            )
-
-        key = (date_str[:10], notes[:40], reflections[:40])
-        if not args.force and key in existing_keys:
-            continue
-
-        new_rows.append(build_row(date_str, mood, notes, reflections, takeaways))
-
-    if args.dry_run:
-        print(f"Novas linhas: {len(new_rows)}")
-        return
-
-    if not os.path.exists(csv_path):
+    if not args.dry_run and not os.path.exists(csv_path):
         print("CSV não encontrado. Crie/posicione o arquivo e rode novamente.")
         return
 
-    with open(csv_path, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        for row in new_rows:
-            writer.writerow(row)
+    batch_size = max(1, args.llm_batch_size)
+    llm_client = None
+    if not args.llm_off:
+        llm_client = LLMClient(
+            moods_sorted,
+            args.llm_model,
+            api_key,
+            batch_size=batch_size,
+            debug=args.llm_debug,
+        )
+    llm_moods_for = llm_client.choose_moods if llm_client else None
+
+    paths = [
+        os.path.join(entries_dir, filename)
+        for filename in sorted(os.listdir(entries_dir))
+        if filename.endswith((".html", ".html.gz"))
+    ]
+    skip_dates = frozenset()
+    if args.skip_existing_dates and not args.force:
+        skip_dates = frozenset(existing_days)
+    entries = iter_entries(paths, mood_pool, args.time, args.llm_off, skip_dates)
+    rows = iter_new_rows(entries, existing_keys_by_prefix, args.force, llm_moods_for, batch_size)
+
+    added = 0
+    try:
+        if args.dry_run:
+            for _ in rows:
+                added += 1
+            print(f"Novas linhas: {added}")
+            return
+
+        with open(csv_path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            for row in rows:
+                writer.writerow(row)
+                added += 1
+    finally:
+        if llm_client:
+            llm_client.close()
 
-    print(f"Linhas adicionadas: {len(new_rows)}")
+    print(f"Linhas adicionadas: {added}")
 
 
 if __name__ == "__main__":